@@ -1,18 +1,35 @@
 """Datasource endpoints: handle uploads and create Datasource records."""
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
 from uuid import uuid4
 import logging
+import mimetypes
+import posixpath
+import zipfile
+import zlib
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from ....schemas import DatasourceRead
+from ....schemas import DatasourceRead, BulkDatasourceItem, BulkDatasourceResponse
 from ....models import Datasource, DatasourceStatus
 from ....database import get_session
-from ....services.processing import process_datasource
+from ....services.processing import process_datasource, process_datasources_batch
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Limits for a single bulk request. Archive entries count individually and are checked against
+# their declared size before decompression, then read with a hard byte bound.
+MAX_BULK_FILES = 500
+MAX_BULK_ENTRY_BYTES = 25 * 1024 * 1024
+MAX_BULK_TOTAL_BYTES = 200 * 1024 * 1024
+# Spooled entries stay in memory up to this size, then roll over to a temp file on disk
+SPOOL_MAX_MEMORY = 1024 * 1024
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
 
 @router.post("/", response_model=DatasourceRead)
 async def create_datasource(
@@ -49,3 +66,183 @@ async def create_datasource(
         await process_datasource(datasource.id, content, datasource.file_type)
 
     return datasource
+
+
+class _BulkEntry(NamedTuple):
+    """One file of a bulk upload: either a spooled payload or the reason it was rejected."""
+
+    file_name: str
+    spool: Optional[SpooledTemporaryFile] = None
+    content_type: Optional[str] = None
+    size: int = 0
+    error: Optional[str] = None
+
+
+def _is_zip(file: UploadFile) -> bool:
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+
+def _spool(src: BinaryIO, limit: int):
+    """Copy `src` into a spooled temp file, reading at most `limit` bytes. Returns `(spool, size)`.
+
+    Raises ValueError when the source holds more than `limit` bytes (declared sizes can lie).
+    """
+    out = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    size = 0
+    try:
+        while True:
+            chunk = src.read(min(64 * 1024, limit - size + 1))
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise ValueError(f"file exceeds size limit of {limit} bytes")
+            out.write(chunk)
+    except BaseException:
+        out.close()
+        raise
+    out.seek(0)
+    return out, size
+
+
+def _spool_entry(
+    src: BinaryIO, file_name: str, content_type: str, declared_size: Optional[int], budget: Dict[str, int]
+) -> _BulkEntry:
+    """Spool one file if the request's file/byte `budget` allows it, and charge it to the budget."""
+    if budget["files"] <= 0:
+        return _BulkEntry(file_name, error=f"bulk limit of {MAX_BULK_FILES} files exceeded")
+    limit = min(MAX_BULK_ENTRY_BYTES, budget["bytes"])
+    # Say which limit was hit: the per-file cap, or what is left of the request's total size budget
+    if limit < MAX_BULK_ENTRY_BYTES:
+        too_large = f"bulk total size limit of {MAX_BULK_TOTAL_BYTES} bytes exceeded"
+    else:
+        too_large = f"file exceeds size limit of {MAX_BULK_ENTRY_BYTES} bytes"
+    if declared_size is not None and declared_size > limit:
+        return _BulkEntry(file_name, error=too_large)
+    try:
+        spool, size = _spool(src, limit)
+    except ValueError:
+        return _BulkEntry(file_name, error=too_large)
+    budget["files"] -= 1
+    budget["bytes"] -= size
+    return _BulkEntry(file_name, spool, content_type, size)
+
+
+def _expand_zip(file: UploadFile, budget: Dict[str, int]) -> List[_BulkEntry]:
+    """Spool each regular file inside an uploaded ZIP archive, one entry at a time.
+
+    The archive is read from the spooled upload file rather than loaded into memory. Directories and
+    OS metadata files (`__MACOSX/`, dotfiles) are skipped. Entries that are encrypted, use an
+    unsupported compression method, are corrupt, or exceed the budget become failed entries.
+    Blocking; call it through `run_in_threadpool`.
+    """
+    try:
+        zf = zipfile.ZipFile(file.file)
+    except (zipfile.BadZipFile, OSError) as e:
+        logger.warning("Invalid ZIP archive %s: %s", file.filename, e)
+        return [_BulkEntry(file.filename, error="invalid zip archive")]
+
+    entries = []
+    with zf:
+        infos = [
+            info
+            for info in zf.infolist()
+            if not info.is_dir()
+            and posixpath.basename(info.filename)
+            and not posixpath.basename(info.filename).startswith(".")
+            and not info.filename.startswith("__MACOSX/")
+        ]
+        for i, info in enumerate(infos):
+            if budget["files"] <= 0:
+                entries.append(
+                    _BulkEntry(
+                        file.filename,
+                        error=f"bulk limit of {MAX_BULK_FILES} files exceeded; {len(infos) - i} remaining entries skipped",
+                    )
+                )
+                break
+            name = info.filename
+            if info.flag_bits & 0x1:
+                entries.append(_BulkEntry(name, error="encrypted zip entries are not supported"))
+                continue
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            try:
+                with zf.open(info) as src:
+                    entries.append(_spool_entry(src, name, content_type, info.file_size, budget))
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error, OSError) as e:
+                logger.warning("Could not extract %s from %s: %s", name, file.filename, e)
+                entries.append(_BulkEntry(name, error=f"could not extract zip entry: {e}"))
+    return entries
+
+
+@router.post("/bulk", response_model=BulkDatasourceResponse)
+async def create_datasources_bulk(
+    files: List[UploadFile] = File(...), background_tasks: BackgroundTasks = None, db: AsyncSession = Depends(get_session)
+):
+    """Accept many uploaded files and/or ZIP archives and create all Datasource records in one transaction.
+
+    ZIP archives are expanded and each entry becomes its own Datasource. Payloads are spooled (to disk
+    past `SPOOL_MAX_MEMORY`) and handed to a single background task, so OCR pages and text chunks from
+    different files share model batches. Returns a per-file status list; files that could not be read
+    or exceed the request limits are reported as `failed` without aborting the rest of the request.
+    """
+    budget = {"files": MAX_BULK_FILES, "bytes": MAX_BULK_TOTAL_BYTES}
+    entries: List[_BulkEntry] = []
+    for file in files:
+        # Decompression and copying are blocking; keep them off the event loop
+        if _is_zip(file):
+            entries.extend(await run_in_threadpool(_expand_zip, file, budget))
+        else:
+            content_type = file.content_type or "application/octet-stream"
+            entries.append(await run_in_threadpool(_spool_entry, file.file, file.filename, content_type, file.size, budget))
+
+    # Keep input order in the response: each result is a created Datasource or a failed BulkDatasourceItem
+    results = []
+    pending = []  # (Datasource, spool)
+    for entry in entries:
+        if entry.error is not None:
+            results.append(BulkDatasourceItem(file_name=entry.file_name, status="failed", error=entry.error))
+            continue
+        storage_key = f"user_{'anonymous'}/{uuid4()}/{entry.file_name}"
+        logger.info(f"Simulated upload: {storage_key} ({entry.size} bytes)")
+        # Assign id/created_at up front so no per-row refresh is needed after the commit
+        datasource = Datasource(
+            id=uuid4(),
+            file_name=entry.file_name,
+            storage_key=storage_key,
+            file_type=entry.content_type,
+            status=DatasourceStatus.uploaded,
+            user_id=None,
+            created_at=datetime.utcnow(),
+        )
+        db.add(datasource)
+        results.append(datasource)
+        pending.append((datasource, entry.spool))
+
+    if pending:
+        try:
+            await db.commit()
+        except Exception:
+            for _, spool in pending:
+                spool.close()
+            raise
+
+    items = [
+        r
+        if isinstance(r, BulkDatasourceItem)
+        else BulkDatasourceItem(
+            file_name=r.file_name, status=r.status.value, datasource=DatasourceRead.model_validate(r, from_attributes=True)
+        )
+        for r in results
+    ]
+
+    # The processing task reads and closes each spool when it reaches that file
+    batch = [(ds.id, spool, ds.file_type) for ds, spool in pending]
+    if batch:
+        if background_tasks is not None:
+            background_tasks.add_task(process_datasources_batch, batch)
+            logger.info("Enqueued bulk processing for %d datasources", len(batch))
+        else:
+            await process_datasources_batch(batch)
+
+    return BulkDatasourceResponse(created=len(pending), failed=len(items) - len(pending), items=items)
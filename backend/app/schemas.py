@@ -1,6 +1,6 @@
 """Pydantic schemas for request/response validation."""
 from __future__ import annotations
-from typing import Optional, Any
+from typing import List, Optional, Any
 from uuid import UUID
 from datetime import datetime
 from pydantic import BaseModel, Field
@@ -26,6 +26,20 @@ class DatasourceRead(DatasourceBase):
         orm_mode = True
 
 
+class BulkDatasourceItem(BaseModel):
+    """Per-file outcome of a bulk upload. `datasource` is set only when a record was created."""
+    file_name: str
+    status: str
+    datasource: Optional[DatasourceRead] = None
+    error: Optional[str] = None
+
+
+class BulkDatasourceResponse(BaseModel):
+    created: int
+    failed: int
+    items: List[BulkDatasourceItem]
+
+
 class DataChunkRead(BaseModel):
     id: UUID
     datasource_id: UUID
@@ -0,0 +1,246 @@
+"""Image preprocessing applied before OCR to cut model cost on phone photos.
+
+A 12-megapixel photo of a ledger page carries far more pixels than OCR needs. The pipeline below
+shrinks and cleans images before they reach TrOCR / pytesseract:
+
+1. EXIF orientation fix (phones store rotation as metadata rather than rotating pixels)
+2. Grayscale conversion
+3. Downscaling so detected text lines are about `target_text_height` pixels tall
+4. Deskew using a projection-profile search over small angles
+5. Binarisation with a local (adaptive) threshold, so uneven lighting and shadows do not erase text
+6. Cropping to the detected text region
+
+Every step can be switched off through `PreprocessConfig`. The analysis steps (threshold, line
+height, skew, bounding box) work on NumPy arrays without Python-level loops over pixels.
+"""
+from dataclasses import dataclass
+import logging
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PreprocessConfig:
+    enabled: bool = True
+    fix_orientation: bool = True
+    grayscale: bool = True
+    downscale: bool = True
+    # Desired height (px) of a text line after downscaling; images are never upscaled
+    target_text_height: int = 40
+    # Hard cap on the longest side after downscaling, applied whether or not text lines are detected
+    max_side: int = 2000
+    # Floor on the longest side so a bad line-height estimate cannot shrink the page to a thumbnail
+    min_side: int = 640
+    binarize: bool = True
+    # Local threshold: a pixel is ink when darker than the mean of the `binarize_window` square around
+    # it by `binarize_sensitivity` of that mean, and by at least `binarize_min_contrast` grey levels
+    # (keeps sensor noise in dark shadows from turning into speckle)
+    binarize_window: int = 51
+    binarize_sensitivity: float = 0.15
+    binarize_min_contrast: int = 20
+    deskew: bool = True
+    max_skew_angle: float = 10.0
+    skew_angle_step: float = 0.5
+    crop: bool = True
+    crop_margin: int = 16
+
+
+# Set OCR_PREPROCESS=0 to pass images to OCR unchanged
+DEFAULT_CONFIG = PreprocessConfig(enabled=os.getenv("OCR_PREPROCESS", "1") != "0")
+
+# Bounds for analysis work so very large images stay cheap to inspect
+_ANALYSIS_MAX_SIDE = 1000
+_SKEW_MAX_SAMPLES = 50_000
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Return the Otsu threshold of a uint8 grayscale array (maximises between-class variance)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    prob = hist / max(gray.size, 1)
+    omega = np.cumsum(prob)
+    mu = np.cumsum(prob * np.arange(256))
+    mu_t = mu[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma_b = (mu_t * omega - mu) ** 2 / (omega * (1.0 - omega))
+    return int(np.argmax(np.nan_to_num(sigma_b)))
+
+
+def ink_mask(gray: np.ndarray, threshold: Optional[int] = None) -> np.ndarray:
+    """Boolean mask of dark (text) pixels, assuming dark ink on a lighter background."""
+    if threshold is None:
+        threshold = otsu_threshold(gray)
+    return gray <= threshold
+
+
+def local_mean(gray: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the `window` x `window` neighbourhood of every pixel, via an integral image (edges replicated)."""
+    r = window // 2
+    padded = np.pad(gray.astype(np.float64), r, mode="edge")
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+    integral[1:, 1:] = padded.cumsum(axis=0).cumsum(axis=1)
+    w = 2 * r + 1
+    total = integral[w:, w:] - integral[:-w, w:] - integral[w:, :-w] + integral[:-w, :-w]
+    return total / (w * w)
+
+
+def local_ink_mask(gray: np.ndarray, window: int = 51, sensitivity: float = 0.15, min_contrast: int = 20) -> np.ndarray:
+    """Boolean mask of pixels noticeably darker than their local background (Bradley-style threshold).
+
+    Unlike a single global threshold this follows lighting gradients and shadows: a uniformly dark
+    region has a local mean equal to itself and is not marked as ink.
+    """
+    if gray.size == 0:
+        return np.zeros(gray.shape, dtype=bool)
+    mean = local_mean(gray, window)
+    return gray < mean - np.maximum(mean * sensitivity, min_contrast)
+
+
+def _runs(flags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start (inclusive) and end (exclusive) indices of consecutive True runs in a 1-D bool array."""
+    d = np.diff(np.concatenate(([0], flags.astype(np.int8), [0])))
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+
+
+def estimate_text_height(
+    ink: np.ndarray,
+    angle: float = 0.0,
+    min_row_fraction: float = 0.01,
+    min_lines: int = 2,
+    max_height_fraction: float = 0.1,
+) -> Optional[float]:
+    """Estimate the median text-line height (px) from the row projection profile of `ink`.
+
+    `angle` is the skew from `estimate_skew`; projecting along it keeps tilted lines from merging.
+    Returns None when the profile does not look like text lines: fewer than `min_lines` runs, or a
+    median taller than `max_height_fraction` of the page (e.g. a shadow classified as ink).
+    """
+    if ink.size == 0:
+        return None
+    if angle:
+        ys, xs = np.nonzero(ink)
+        if ys.size == 0:
+            return None
+        rad = np.deg2rad(angle)
+        proj = np.rint(ys * np.cos(rad) - xs * np.sin(rad)).astype(np.int64)
+        counts = np.bincount(proj - proj.min())
+    else:
+        counts = ink.sum(axis=1)
+    rows = counts / ink.shape[1] > min_row_fraction
+    starts, ends = _runs(rows)
+    heights = ends - starts
+    heights = heights[heights >= 2]
+    if heights.size < min_lines:
+        return None
+    median = float(np.median(heights))
+    if median > max_height_fraction * rows.size:
+        return None
+    return median
+
+
+def estimate_skew(ink: np.ndarray, max_angle: float = 10.0, step: float = 0.5) -> float:
+    """Estimate text skew in degrees by maximising the sharpness of the row projection profile.
+
+    Ink pixel coordinates are projected onto the rotated y-axis for every candidate angle at once;
+    the angle whose profile has the largest sum of squared bin counts (crisp text lines separated
+    by empty gaps) wins. Positive values mean the text slopes down to the right.
+    """
+    ys, xs = np.nonzero(ink)
+    if ys.size < 50:
+        return 0.0
+    if ys.size > _SKEW_MAX_SAMPLES:
+        idx = np.random.default_rng(0).choice(ys.size, _SKEW_MAX_SAMPLES, replace=False)
+        ys, xs = ys[idx], xs[idx]
+    angles = np.arange(-max_angle, max_angle + step / 2, step)
+    rad = np.deg2rad(angles).astype(np.float32)[:, None]
+    proj = ys.astype(np.float32)[None, :] * np.cos(rad) - xs.astype(np.float32)[None, :] * np.sin(rad)
+    bins = np.rint(proj - proj.min(axis=1, keepdims=True)).astype(np.int64)
+    nbins = int(bins.max()) + 1
+    offsets = np.arange(len(angles), dtype=np.int64)[:, None] * nbins
+    counts = np.bincount((bins + offsets).ravel(), minlength=len(angles) * nbins).reshape(len(angles), nbins)
+    scores = (counts.astype(np.float64) ** 2).sum(axis=1)
+    return float(angles[int(np.argmax(scores))])
+
+
+def text_bbox(ink: np.ndarray, margin: int = 0, min_fraction: float = 0.002) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box `(left, top, right, bottom)` of rows/columns holding ink, ignoring sparse specks."""
+    h, w = ink.shape
+    rows = np.flatnonzero(ink.sum(axis=1) > max(1, min_fraction * w))
+    cols = np.flatnonzero(ink.sum(axis=0) > max(1, min_fraction * h))
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return (
+        max(int(cols[0]) - margin, 0),
+        max(int(rows[0]) - margin, 0),
+        min(int(cols[-1]) + 1 + margin, w),
+        min(int(rows[-1]) + 1 + margin, h),
+    )
+
+
+def _analysis_view(gray: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Strided view of `gray` with its longest side <= _ANALYSIS_MAX_SIDE, plus the applied factor."""
+    stride = max(1, int(np.ceil(max(gray.shape) / _ANALYSIS_MAX_SIDE)))
+    return gray[::stride, ::stride], 1.0 / stride
+
+
+def preprocess_image(image: Image.Image, config: Optional[PreprocessConfig] = None) -> Image.Image:
+    """Run the configured preprocessing steps on `image` and return the image to hand to OCR.
+
+    The result is mode "L" when grayscale conversion is enabled, otherwise "RGB".
+    """
+    config = config or DEFAULT_CONFIG
+    if not config.enabled:
+        return image
+
+    if config.fix_orientation:
+        image = ImageOps.exif_transpose(image)
+    image = image.convert("L" if config.grayscale else "RGB")
+
+    # Skew is scale-invariant, so estimate it once on a small view and reuse it after downscaling
+    angle = 0.0
+    if config.downscale or (config.deskew and config.grayscale):
+        view, factor = _analysis_view(np.asarray(image.convert("L")))
+        view_ink = local_ink_mask(
+            view, config.binarize_window, config.binarize_sensitivity, config.binarize_min_contrast
+        )
+        if config.deskew and config.grayscale:
+            angle = estimate_skew(view_ink, config.max_skew_angle, config.skew_angle_step)
+
+    if config.downscale:
+        height = estimate_text_height(view_ink, angle)
+        scale = config.target_text_height / (height / factor) if height else 1.0
+        scale = min(scale, config.max_side / max(image.size), 1.0)
+        scale = max(scale, min(config.min_side / max(image.size), 1.0))
+        if scale < 1.0:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.Resampling.LANCZOS)
+
+    if not config.grayscale:
+        # Remaining steps need a single channel; leave colour images as they are
+        return image
+
+    # Threshold before rotating: the corners filled in by deskew would otherwise form edges that read as ink
+    gray = np.asarray(image)
+    ink = local_ink_mask(gray, config.binarize_window, config.binarize_sensitivity, config.binarize_min_contrast)
+
+    if config.deskew and angle:
+        # PIL rotates counter-clockwise, which undoes a clockwise (down-to-the-right) skew
+        image = image.rotate(
+            angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=int(np.median(gray))
+        )
+        mask = Image.fromarray(ink.astype(np.uint8) * 255)
+        ink = np.asarray(mask.rotate(angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=0)) > 127
+
+    if config.binarize:
+        image = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+
+    if config.crop:
+        box = text_bbox(ink, margin=config.crop_margin)
+        if box is not None:
+            image = image.crop(box)
+
+    return image
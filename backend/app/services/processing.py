@@ -2,12 +2,13 @@
 
 This module tries to use Hugging Face models when available (TrOCR for handwritten OCR,
 and SentenceTransformers for embeddings), with sensible fallbacks to `pytesseract` for OCR.
+Images are shrunk and cleaned by `preprocessing.preprocess_image` before OCR.
 Model loading is done lazily and CPU/GPU usage depends on installed backends (torch).
 """
 import io
 import logging
 import asyncio
-from typing import Optional
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
 from uuid import UUID
 
 from PIL import Image
@@ -16,6 +17,7 @@ from sqlalchemy import select, update
 
 from ..database import AsyncSessionLocal
 from ..models import Datasource, DataChunk, DatasourceStatus
+from .preprocessing import PreprocessConfig, preprocess_image
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,10 @@ _trocr_processor = None
 _trocr_model = None
 _embed_model = None
 
+# Batch sizes used when processing several datasources together (bulk uploads)
+OCR_BATCH_SIZE = 8
+EMBED_BATCH_SIZE = 64
+
 
 def _load_trocr():
     global _trocr_processor, _trocr_model
@@ -54,8 +60,12 @@ def _load_embed_model():
             _embed_model = None
 
 
-def _ocr_image_sync(image: Image.Image) -> str:
-    """Run OCR on a PIL Image using TrOCR if available, otherwise fallback to pytesseract."""
+def _ocr_image_sync(image: Image.Image, preprocess: Optional[PreprocessConfig] = None) -> str:
+    """Run OCR on a PIL Image using TrOCR if available, otherwise fallback to pytesseract.
+
+    The image is first passed through `preprocess_image` (orientation, downscale, binarise, deskew, crop).
+    """
+    image = preprocess_image(image, preprocess).convert("RGB")
     # Try TrOCR first
     try:
         _load_trocr()
@@ -77,6 +87,49 @@ def _ocr_image_sync(image: Image.Image) -> str:
         return ""  # return empty if OCR fails
 
 
+def _ocr_images_sync(images: List[Image.Image], preprocess: Optional[PreprocessConfig] = None) -> List[str]:
+    """Run OCR on a batch of PIL Images in a single TrOCR forward pass, falling back to pytesseract per image.
+
+    Errors are contained per image: a page that fails preprocessing or OCR yields "" while the rest of
+    the batch (often pages from other uploads) keeps its text.
+    """
+    if not images:
+        return []
+    texts = ["" for _ in images]
+    prepared = {}
+    for i, img in enumerate(images):
+        try:
+            prepared[i] = preprocess_image(img, preprocess).convert("RGB")
+        except Exception as e:
+            logger.warning("Preprocessing failed for page %d of OCR batch: %s", i, e)
+    if not prepared:
+        return texts
+
+    try:
+        _load_trocr()
+        if _trocr_processor and _trocr_model is not None:
+            pixel_values = _trocr_processor(images=list(prepared.values()), return_tensors="pt").pixel_values
+            generated_ids = _trocr_model.generate(pixel_values)
+            outs = _trocr_processor.batch_decode(generated_ids, skip_special_tokens=True)
+            for i, out in zip(prepared, outs):
+                texts[i] = out
+            return texts
+    except Exception as e:
+        logger.debug("Batched TrOCR failed: %s", e)
+
+    try:
+        import pytesseract
+    except Exception as e:
+        logger.warning("pytesseract not available: %s", e)
+        return texts
+    for i, img in prepared.items():
+        try:
+            texts[i] = pytesseract.image_to_string(img)
+        except Exception as e:
+            logger.warning("pytesseract failed for page %d of OCR batch: %s", i, e)
+    return texts
+
+
 def _embed_text_sync(text: str) -> Optional[list]:
     """Compute embedding for a single text chunk synchronously. Returns list[float] or None."""
     try:
@@ -90,6 +143,21 @@ def _embed_text_sync(text: str) -> Optional[list]:
         return None
 
 
+def _embed_texts_sync(texts: List[str]) -> List[Optional[list]]:
+    """Compute embeddings for many text chunks in one `encode` call. Returns a list aligned with `texts`."""
+    if not texts:
+        return []
+    try:
+        _load_embed_model()
+        if _embed_model is None:
+            return [None for _ in texts]
+        embs = _embed_model.encode(texts, batch_size=EMBED_BATCH_SIZE)
+        return [e.tolist() for e in embs]
+    except Exception as e:
+        logger.warning("Batched embedding failed: %s", e)
+        return [None for _ in texts]
+
+
 def _split_text_chunks(text: str, max_chars: int = 500):
     """Naive splitting of text into chunks of <= max_chars, preserving lines when possible."""
     text = text.strip()
@@ -132,7 +200,8 @@ async def process_datasource(datasource_id: UUID, content: bytes, content_type:
             # Extract text based on content_type (very basic)
             extracted_text = ""
             if content_type and content_type.startswith("image/"):
-                img = Image.open(io.BytesIO(content)).convert("RGB")
+                # Keep the original image (and its EXIF orientation) for preprocessing
+                img = Image.open(io.BytesIO(content))
                 loop = asyncio.get_running_loop()
                 # run CPU-bound OCR in thread pool
                 extracted_text = await loop.run_in_executor(None, _ocr_image_sync, img)
@@ -189,3 +258,145 @@ async def process_datasource(datasource_id: UUID, content: bytes, content_type:
                 session.add(ds)
                 await session.commit()
             return
+
+
+def _extract_pages(content: bytes, content_type: Optional[str]) -> Tuple[List[Image.Image], str]:
+    """Decode an upload into page images to OCR, or directly into text when no OCR is needed.
+
+    Returns `(pages, text)`; exactly one of them is meaningful for a given content type.
+    Raises if an image cannot be decoded.
+    """
+    if content_type and content_type.startswith("image/"):
+        img = Image.open(io.BytesIO(content))
+        # `Image.open` is lazy; decode now so a corrupt/truncated file fails here, per file
+        img.load()
+        return [img], ""
+    if content_type == "application/pdf":
+        try:
+            from pdf2image import convert_from_bytes
+
+            return list(convert_from_bytes(content)), ""
+        except Exception as e:
+            logger.warning("pdf2image not available or failed: %s; falling back to mock text", e)
+            return [], "[pdf text extraction not available in this environment]"
+    try:
+        return [], content.decode("utf-8")
+    except Exception:
+        return [], ""
+
+
+def _load_pages(source: Union[bytes, BinaryIO], content_type: Optional[str]) -> Tuple[List[Image.Image], str]:
+    """Read a bulk payload (bytes or a spooled file, which is closed) and extract its pages/text."""
+    if isinstance(source, (bytes, bytearray)):
+        return _extract_pages(bytes(source), content_type)
+    try:
+        return _extract_pages(source.read(), content_type)
+    finally:
+        source.close()
+
+
+async def process_datasources_batch(items: Sequence[Tuple[UUID, Union[bytes, BinaryIO], Optional[str]]]) -> None:
+    """Background task for bulk uploads: process many datasources with shared OCR and embedding batches.
+
+    - `items` is a sequence of `(datasource_id, content, content_type)` tuples; `content` may be bytes
+      or a spooled file, which is read only when that file is reached and then closed.
+    - Pages from consecutive files are OCR'd together in batches of `OCR_BATCH_SIZE` as they are
+      decoded, and chunks from all files are embedded together in batches of `EMBED_BATCH_SIZE`.
+    - A file that cannot be decoded is marked `failed` without affecting the others; all status
+      updates and DataChunks are written with a single commit per stage.
+    """
+    if not items:
+        return
+    async with AsyncSessionLocal() as session:  # type: AsyncSession
+        ids = [ds_id for ds_id, _, _ in items]
+        try:
+            q = await session.execute(select(Datasource).where(Datasource.id.in_(ids)))
+            by_id: Dict[UUID, Datasource] = {ds.id: ds for ds in q.scalars()}
+            for ds_id in ids:
+                if ds_id not in by_id:
+                    logger.error("Datasource %s not found", ds_id)
+            for ds in by_id.values():
+                ds.status = DatasourceStatus.processing
+                session.add(ds)
+            await session.commit()
+
+            loop = asyncio.get_running_loop()
+
+            # Decode files one at a time; pages from different files fill the same OCR batch, and
+            # each batch is run as soon as it is full so only about one batch of pages is held at once
+            texts: Dict[UUID, List[str]] = {}
+            pages: List[Tuple[UUID, Image.Image]] = []
+            n_pages = 0
+
+            async def _ocr_batch(batch: List[Tuple[UUID, Image.Image]]) -> None:
+                outs = await loop.run_in_executor(None, _ocr_images_sync, [img for _, img in batch])
+                for (page_ds_id, _), txt in zip(batch, outs):
+                    texts[page_ds_id].append(txt)
+
+            for ds_id, source, content_type in items:
+                ds = by_id.get(ds_id)
+                if ds is None:
+                    continue
+                try:
+                    file_pages, text = await loop.run_in_executor(None, _load_pages, source, content_type)
+                except Exception as e:
+                    logger.warning("Could not decode datasource %s: %s", ds_id, e)
+                    ds.status = DatasourceStatus.failed
+                    session.add(ds)
+                    continue
+                texts[ds_id] = [text] if text else []
+                pages.extend((ds_id, page) for page in file_pages)
+                n_pages += len(file_pages)
+                while len(pages) >= OCR_BATCH_SIZE:
+                    batch, pages = pages[:OCR_BATCH_SIZE], pages[OCR_BATCH_SIZE:]
+                    await _ocr_batch(batch)
+            if pages:
+                await _ocr_batch(pages)
+
+            # Chunk per file, then embed all chunks together
+            chunk_owners: List[UUID] = []
+            chunk_texts: List[str] = []
+            for ds_id, parts in texts.items():
+                chunks = _split_text_chunks("\n\n".join(parts), max_chars=500)
+                if not chunks:
+                    logger.info("No text extracted for datasource %s", ds_id)
+                chunk_owners.extend(ds_id for _ in chunks)
+                chunk_texts.extend(chunks)
+
+            embeddings = await loop.run_in_executor(None, _embed_texts_sync, chunk_texts)
+            for ds_id, c, emb in zip(chunk_owners, chunk_texts, embeddings):
+                ds = by_id[ds_id]
+                session.add(
+                    DataChunk(
+                        datasource_id=ds.id,
+                        user_id=ds.user_id,
+                        chunk_text=c,
+                        metadata_={"source": "ocr"},
+                        embedding=emb,
+                    )
+                )
+
+            for ds_id in texts:
+                by_id[ds_id].status = DatasourceStatus.completed
+                session.add(by_id[ds_id])
+            await session.commit()
+            logger.info(
+                "Bulk processing complete for %d datasources (pages=%d, chunks=%d)",
+                len(texts),
+                n_pages,
+                len(chunk_texts),
+            )
+        except Exception as exc:  # broad catch to ensure statuses updated
+            logger.exception("Bulk processing failed for datasources %s: %s", ids, exc)
+            await session.rollback()
+            q = await session.execute(select(Datasource).where(Datasource.id.in_(ids)))
+            for ds in q.scalars():
+                ds.status = DatasourceStatus.failed
+                session.add(ds)
+            await session.commit()
+            return
+        finally:
+            # Release spooled payloads that were never reached
+            for _, source, _ in items:
+                if not isinstance(source, (bytes, bytearray)):
+                    source.close()
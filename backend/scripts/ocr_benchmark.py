@@ -0,0 +1,165 @@
+"""OCR benchmark: compare OCR time and accuracy with and without image preprocessing.
+
+Sample images are phone-photo-like pages rendered from known text (large, skewed, noisy, unevenly
+lit, with EXIF rotation), so accuracy can be measured against ground truth. Pass `--samples DIR`
+to use your own images instead; each `name.jpg`/`name.png` needs a `name.txt` with the expected text.
+
+Usage: python scripts/ocr_benchmark.py --engine tesseract --repeat 3
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services.preprocessing import PreprocessConfig, preprocess_image  # noqa: E402
+
+SAMPLE_LINES = [
+    "12/03 milk 10 litres 450",
+    "13/03 rice 25 kg 1200",
+    "14/03 sugar 5 kg 240",
+    "15/03 tea leaves 1 kg 380",
+    "16/03 cash received 2000",
+    "17/03 diesel 20 litres 1800",
+]
+
+
+def _render_page(lines, size, font_size, skew, background=205, lighting=25, shadow=0, ink=35, noise=12.0, seed=0):
+    """Render `lines` onto an unevenly lit, noisy page and tilt it by `skew` degrees (clockwise).
+
+    Brightness ramps from `background - lighting` (left) to `background + lighting` (right); a
+    non-zero `shadow` darkens a soft-edged horizontal band near the middle by up to that many levels.
+    """
+    w, h = size
+    gradient = np.linspace(background - lighting, background + lighting, w, dtype=np.float32)[None, :]
+    arr = np.repeat(gradient, h, axis=0)
+    # Soft-edged shadow band (roughly 0.3h-0.45h), like a hand or phone held over the page
+    ys = np.arange(h, dtype=np.float32) / h
+    band = np.clip(np.minimum(ys - 0.27, 0.48 - ys) / 0.06, 0.0, 1.0)
+    arr -= shadow * band[:, None]
+    # Draw and tilt only the text layer, so the page itself has no rotated edges
+    layer = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(layer)
+    font = ImageFont.load_default(size=font_size)
+    for i, line in enumerate(lines):
+        draw.text((w // 8, h // 6 + i * int(font_size * 1.8)), line, fill=255, font=font)
+    layer = layer.rotate(-skew, resample=Image.Resampling.BICUBIC)
+    alpha = np.asarray(layer, dtype=np.float32) / 255.0
+    arr = arr * (1.0 - alpha) + ink * alpha
+    arr += np.random.default_rng(seed).normal(0, noise, arr.shape).astype(np.float32)
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).convert("RGB")
+
+
+def _to_upload(image, exif_orientation=None):
+    """Round-trip through JPEG bytes (as an upload would), optionally storing rotation only in EXIF."""
+    exif = Image.Exif()
+    if exif_orientation == 6:
+        # Orientation 6: pixels are stored rotated 90 degrees counter-clockwise
+        image = image.transpose(Image.Transpose.ROTATE_90)
+        exif[0x0112] = 6
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=90, exif=exif)
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+
+def synthetic_samples():
+    """Return `[(name, image, expected_text)]` for the built-in samples."""
+    text = "\n".join(SAMPLE_LINES)
+    return [
+        ("phone_photo_12mp", _to_upload(_render_page(SAMPLE_LINES, (3000, 4000), 110, skew=3.0)), text),
+        (
+            "phone_photo_exif_rotated",
+            _to_upload(_render_page(SAMPLE_LINES, (3000, 4000), 110, skew=-2.0, seed=1), exif_orientation=6),
+            text,
+        ),
+        (
+            "phone_photo_uneven_light",
+            _to_upload(
+                _render_page(SAMPLE_LINES, (3000, 4000), 110, skew=2.0, background=160, lighting=70, shadow=50, seed=3)
+            ),
+            text,
+        ),
+        ("small_scan", _to_upload(_render_page(SAMPLE_LINES, (1200, 900), 40, skew=0.0, noise=4.0, seed=2)), text),
+    ]
+
+
+def load_samples(directory):
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        truth = os.path.join(directory, stem + ".txt")
+        if ext.lower() in (".jpg", ".jpeg", ".png") and os.path.exists(truth):
+            with open(truth, encoding="utf-8") as fh:
+                samples.append((stem, Image.open(os.path.join(directory, name)), fh.read()))
+    return samples
+
+
+def _levenshtein(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def accuracy(predicted, expected):
+    """Character accuracy (1 - CER) after collapsing whitespace."""
+    p = " ".join(predicted.split()).lower()
+    e = " ".join(expected.split()).lower()
+    if not e:
+        return 1.0 if not p else 0.0
+    return max(0.0, 1.0 - _levenshtein(p, e) / len(e))
+
+
+def _ocr_fn(engine):
+    if engine == "tesseract":
+        import pytesseract
+
+        return pytesseract.image_to_string
+    # "auto" uses the same path as the app: TrOCR if installed, else pytesseract
+    from app.services import processing
+
+    return lambda image: processing._ocr_image_sync(image, PreprocessConfig(enabled=False))
+
+
+def run(samples, engine, repeat):
+    ocr = _ocr_fn(engine)
+    configs = {"raw": PreprocessConfig(enabled=False), "preprocessed": PreprocessConfig()}
+    print(f"{'sample':<28}{'mode':<14}{'pixels':>12}{'prep_s':>9}{'ocr_s':>9}{'accuracy':>10}")
+    totals = {mode: [0.0, 0.0, 0.0] for mode in configs}
+    for name, image, expected in samples:
+        for mode, config in configs.items():
+            prep_t = ocr_t = 0.0
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                prepared = preprocess_image(image, config).convert("RGB")
+                t1 = time.perf_counter()
+                text = ocr(prepared)
+                t2 = time.perf_counter()
+                prep_t += t1 - t0
+                ocr_t += t2 - t1
+            acc = accuracy(text, expected)
+            pixels = prepared.width * prepared.height
+            print(f"{name:<28}{mode:<14}{pixels:>12}{prep_t / repeat:>9.3f}{ocr_t / repeat:>9.3f}{acc:>10.3f}")
+            totals[mode][0] += prep_t / repeat
+            totals[mode][1] += ocr_t / repeat
+            totals[mode][2] += acc / len(samples)
+    for mode, (prep_t, ocr_t, acc) in totals.items():
+        print(f"TOTAL {mode:<14} prep={prep_t:.3f}s ocr={ocr_t:.3f}s mean_accuracy={acc:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=["auto", "tesseract"], default="tesseract")
+    parser.add_argument("--samples", help="directory of images with matching .txt ground truth")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    samples = load_samples(args.samples) if args.samples else synthetic_samples()
+    run(samples, args.engine, args.repeat)
@@ -1,8 +1,19 @@
+import io
+import sys
+import types
+import uuid
+import zipfile
+
 import pytest
 import asyncio
 from httpx import AsyncClient
+from PIL import Image
 
 from app.main import app
+from app.api.v1.endpoints import datasources as datasources_endpoint
+from app.database import get_session
+from app.models import Datasource, DatasourceStatus
+from app.services import processing
 
 
 @pytest.mark.asyncio
@@ -23,3 +34,247 @@ async def test_create_datasource_enqueues_processing(monkeypatch):
     # BackgroundTasks executes after response; give a tiny moment for it
     await asyncio.sleep(0.05)
     assert called["cnt"] == 1
+
+
+class DummySession:
+    def add(self, obj):
+        pass
+
+    async def commit(self):
+        pass
+
+
+async def fake_get_session():
+    yield DummySession()
+
+
+async def _post_bulk(files):
+    app.dependency_overrides[get_session] = fake_get_session
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            return await ac.post("/api/v1/datasources/bulk", files=files)
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_enqueues_single_batch(monkeypatch):
+    batches = []
+
+    async def fake_batch_processing(items):
+        batches.append([(ds_id, source.read(), ct) for ds_id, source, ct in items])
+
+    monkeypatch.setattr("app.api.v1.endpoints.datasources.process_datasources_batch", fake_batch_processing)
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("receipts/jan.txt", "milk 10")
+        zf.writestr("receipts/feb.txt", "दूध 12")
+        zf.writestr("__MACOSX/receipts/._jan.txt", "junk")
+
+    resp = await _post_bulk(
+        [
+            ("files", ("ledger.txt", b"hello world", "text/plain")),
+            ("files", ("month.zip", buf.getvalue(), "application/zip")),
+            ("files", ("broken.zip", b"not a zip", "application/zip")),
+        ]
+    )
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["created"] == 3
+    assert data["failed"] == 1
+    assert [i["file_name"] for i in data["items"]] == ["ledger.txt", "receipts/jan.txt", "receipts/feb.txt", "broken.zip"]
+    assert data["items"][-1]["status"] == "failed"
+
+    await asyncio.sleep(0.05)
+    # All files are handed to one processing task so their pages/chunks can share model batches
+    assert len(batches) == 1
+    assert [(content, ct) for _, content, ct in batches[0]] == [
+        (b"hello world", "text/plain"),
+        (b"milk 10", "text/plain"),
+        ("दूध 12".encode("utf-8"), "text/plain"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_rejects_entries_before_decompression(monkeypatch):
+    async def fake_batch_processing(items):
+        pass
+
+    spooled = []
+    real_spool = datasources_endpoint._spool
+
+    def counting_spool(src, limit):
+        out, size = real_spool(src, limit)
+        spooled.append(size)
+        return out, size
+
+    monkeypatch.setattr("app.api.v1.endpoints.datasources.process_datasources_batch", fake_batch_processing)
+    monkeypatch.setattr("app.api.v1.endpoints.datasources._spool", counting_spool)
+    monkeypatch.setattr("app.api.v1.endpoints.datasources.MAX_BULK_FILES", 3)
+    monkeypatch.setattr("app.api.v1.endpoints.datasources.MAX_BULK_ENTRY_BYTES", 1000)
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("secret.txt", "x")
+        zf.writestr("bomb.txt", b"0" * 1_000_000)
+        zf.writestr("a.txt", "a")
+        zf.writestr("b.txt", "b")
+        zf.writestr("c.txt", "c")
+        zf.writestr("d.txt", "d")
+    data = bytearray(buf.getvalue())
+    # Mark the first entry as encrypted in the central directory
+    data[data.find(b"PK\x01\x02") + 8] |= 0x1
+
+    resp = await _post_bulk([("files", ("month.zip", bytes(data), "application/zip"))])
+
+    assert resp.status_code == 200
+    items = resp.json()["items"]
+    assert [(i["file_name"], i["status"]) for i in items] == [
+        ("secret.txt", "failed"),
+        ("bomb.txt", "failed"),
+        ("a.txt", "uploaded"),
+        ("b.txt", "uploaded"),
+        ("c.txt", "uploaded"),
+        ("month.zip", "failed"),
+    ]
+    assert "encrypted" in items[0]["error"]
+    assert "size limit" in items[1]["error"]
+    assert "1 remaining entries skipped" in items[-1]["error"]
+    # Only accepted entries were decompressed
+    assert spooled == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_reports_total_size_limit(monkeypatch):
+    async def fake_batch_processing(items):
+        pass
+
+    monkeypatch.setattr("app.api.v1.endpoints.datasources.process_datasources_batch", fake_batch_processing)
+    monkeypatch.setattr("app.api.v1.endpoints.datasources.MAX_BULK_TOTAL_BYTES", 10)
+
+    resp = await _post_bulk([("files", (f"{i}.txt", b"abcdef", "text/plain")) for i in range(3)])
+
+    items = resp.json()["items"]
+    assert [i["status"] for i in items] == ["uploaded", "failed", "failed"]
+    assert all(i["error"] == "bulk total size limit of 10 bytes exceeded" for i in items[1:])
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return iter(self.rows)
+
+
+class FakeBatchSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.added = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt):
+        return FakeResult(self.rows)
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def _png(width):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, 20), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_process_datasources_batch_shares_batches_and_tracks_status(monkeypatch):
+    ids = [uuid.uuid4() for _ in range(4)]
+    rows = [
+        Datasource(id=ds_id, file_name=f"f{i}", storage_key="k", file_type="x", status=DatasourceStatus.uploaded)
+        for i, ds_id in enumerate(ids)
+    ]
+    session = FakeBatchSession(rows)
+    ocr_batches = []
+
+    def fake_ocr(images):
+        ocr_batches.append(len(images))
+        return [f"page {img.width}" for img in images]
+
+    def fake_embed(texts):
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(processing, "AsyncSessionLocal", lambda: session)
+    monkeypatch.setattr(processing, "_ocr_images_sync", fake_ocr)
+    monkeypatch.setattr(processing, "_embed_texts_sync", fake_embed)
+    monkeypatch.setattr(processing, "OCR_BATCH_SIZE", 2)
+
+    truncated = _png(40)[:30]
+    sources = [io.BytesIO(_png(10)), io.BytesIO(_png(30)), io.BytesIO(b"cash 2000"), io.BytesIO(truncated)]
+    items = list(zip(ids, sources, ["image/png", "image/png", "text/plain", "image/png"]))
+
+    await processing.process_datasources_batch(items)
+
+    # Pages from the two image files were OCR'd in one shared batch
+    assert ocr_batches == [2]
+    chunks = {c.datasource_id: c for c in session.added if isinstance(c, processing.DataChunk)}
+    assert chunks[ids[0]].chunk_text == "page 10"
+    assert chunks[ids[1]].chunk_text == "page 30"
+    assert chunks[ids[2]].chunk_text == "cash 2000"
+    assert chunks[ids[2]].embedding == [9.0]
+    assert ids[3] not in chunks
+    # Only the corrupt file fails; the rest complete
+    assert [r.status for r in rows] == [DatasourceStatus.completed] * 3 + [DatasourceStatus.failed]
+    assert all(s.closed for s in sources)
+
+
+@pytest.mark.asyncio
+async def test_process_datasources_batch_isolates_failing_pages(monkeypatch):
+    ids = [uuid.uuid4() for _ in range(5)]
+    rows = [
+        Datasource(id=ds_id, file_name=f"f{i}", storage_key="k", file_type="x", status=DatasourceStatus.uploaded)
+        for i, ds_id in enumerate(ids)
+    ]
+    session = FakeBatchSession(rows)
+
+    def fake_image_to_string(img):
+        if img.width == 20:
+            raise RuntimeError("tesseract crashed")
+        return f"text {img.width}"
+
+    real_preprocess = processing.preprocess_image
+
+    def flaky_preprocess(img, config=None):
+        if img.width == 30:
+            raise ValueError("cannot preprocess")
+        # Skip real preprocessing so page widths still identify the files
+        return real_preprocess(img, processing.PreprocessConfig(enabled=False))
+
+    monkeypatch.setitem(sys.modules, "pytesseract", types.SimpleNamespace(image_to_string=fake_image_to_string))
+    monkeypatch.setattr(processing, "_load_trocr", lambda: None)
+    monkeypatch.setattr(processing, "_trocr_model", None)
+    monkeypatch.setattr(processing, "preprocess_image", flaky_preprocess)
+    monkeypatch.setattr(processing, "_embed_texts_sync", lambda texts: [None for _ in texts])
+    monkeypatch.setattr(processing, "AsyncSessionLocal", lambda: session)
+    monkeypatch.setattr(processing, "OCR_BATCH_SIZE", 4)
+
+    sources = [io.BytesIO(_png(w)) for w in (10, 20, 30, 40)] + [io.BytesIO(b"cash 2000")]
+    items = list(zip(ids, sources, ["image/png"] * 4 + ["text/plain"]))
+
+    await processing.process_datasources_batch(items)
+
+    chunks = {c.datasource_id: c.chunk_text for c in session.added if isinstance(c, processing.DataChunk)}
+    # The pages that failed in tesseract / preprocessing lose only their own text
+    assert chunks == {ids[0]: "text 10", ids[3]: "text 40", ids[4]: "cash 2000"}
+    assert all(r.status == DatasourceStatus.completed for r in rows)
@@ -0,0 +1,112 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.preprocessing import (
+    PreprocessConfig,
+    estimate_skew,
+    estimate_text_height,
+    ink_mask,
+    otsu_threshold,
+    preprocess_image,
+)
+
+
+def _page(size=(2400, 1800), skew=0.0):
+    """Light page with dark horizontal bars standing in for text lines, tilted clockwise by `skew` degrees."""
+    img = Image.new("L", size, 210)
+    draw = ImageDraw.Draw(img)
+    for i in range(8):
+        top = 400 + i * 120
+        draw.rectangle((500, top, 1900, top + 60), fill=30)
+    return img.rotate(-skew, fillcolor=210)
+
+
+def test_otsu_threshold_separates_ink_from_background():
+    gray = np.asarray(_page())
+    t = otsu_threshold(gray)
+    assert 30 <= t < 210
+    assert ink_mask(gray, t).mean() < 0.5
+
+
+def test_estimate_skew_recovers_angle():
+    ink = ink_mask(np.asarray(_page(skew=4.0)))
+    assert abs(estimate_skew(ink) - 4.0) <= 0.5
+
+
+def test_preprocess_downscales_crops_and_fixes_exif_orientation():
+    # Store the page rotated with EXIF orientation 6, as phone cameras do
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buf = io.BytesIO()
+    _page(skew=3.0).transpose(Image.Transpose.ROTATE_90).convert("RGB").save(buf, format="JPEG", exif=exif)
+    image = Image.open(io.BytesIO(buf.getvalue()))
+
+    out = preprocess_image(image, PreprocessConfig(target_text_height=30))
+
+    assert out.mode == "L"
+    assert out.width > out.height  # upright again
+    assert out.width * out.height < 2400 * 1800 / 4
+    assert set(np.unique(np.asarray(out))) <= {0, 255}
+
+
+def test_preprocess_shadowed_page_is_not_shrunk_to_thumbnail():
+    # A shadowed left third that Otsu classifies as ink looks like one page-tall "line"
+    img = Image.new("L", (3000, 4000), 210)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, 1000, 4000), fill=90)
+    for i in range(20):
+        top = 400 + i * 150
+        draw.rectangle((1100, top, 2800, top + 50), fill=30)
+
+    assert estimate_text_height(ink_mask(np.asarray(img))) is None
+    out = preprocess_image(img)
+    assert max(out.size) >= PreprocessConfig().min_side
+    # The shadow is background, not a black block, and every text bar survives
+    black = np.asarray(out) == 0
+    assert black.mean() < 0.5
+    assert len(_row_runs(black)) == 20
+
+    # The floor also holds when the target text height would otherwise shrink the page further
+    out = preprocess_image(_page(), PreprocessConfig(target_text_height=2, crop=False))
+    assert max(out.size) >= PreprocessConfig().min_side
+
+
+def _row_runs(black):
+    """Row ranges that contain ink, i.e. the text lines left after binarisation."""
+    rows = black.mean(axis=1) > 0.05
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.astype(np.int8), [0]))))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def test_preprocess_keeps_text_under_strong_lighting_gradient():
+    # Background fades from 230 to 110 left to right, with a darker band across the middle;
+    # ink is always 80 levels below the local background
+    h, w = 2000, 3000
+    page = np.repeat(np.linspace(230, 110, w)[None, :], h, axis=0)
+    page[900:1300] -= 60
+    text = np.zeros((h, w), dtype=bool)
+    for i in range(10):
+        top = 200 + i * 160
+        for left in range(200, 2900, 300):
+            text[top : top + 40, left : left + 200] = True
+    page[text] -= 80
+    img = Image.fromarray(np.clip(page, 0, 255).astype(np.uint8))
+
+    out = preprocess_image(img, PreprocessConfig(deskew=False, crop=False))
+    black = np.asarray(out) == 0
+
+    # No region collapses to solid black, including the dark right side and the shadow band
+    assert black.mean(axis=0).max() < 0.5
+    # A hard shadow edge may leave a thin line; count only runs as tall as a text line
+    assert len([(a, b) for a, b in _row_runs(black) if b - a >= 15]) == 10
+    # Text in the darkest corner (right side, inside the band) is still there
+    sy, sx = out.height / h, out.width / w
+    line = black[int(1160 * sy) : int(1200 * sy), int(2600 * sx) : int(2800 * sx)]
+    assert line.mean() > 0.8
+
+
+def test_preprocess_disabled_returns_image_unchanged():
+    image = _page().convert("RGB")
+    assert preprocess_image(image, PreprocessConfig(enabled=False)) is image